@@ -3,7 +3,7 @@
 
 import asyncio
 import os
-import pandas as pd
+import numpy as np
 from bleak import BleakScanner, BleakClient
 import time
 
@@ -19,45 +19,47 @@ CONNECTED_FLAG = "ble_connected.txt"
 START_FLAG = "start.txt"
 STOP_FLAG = "stop.txt"
 
-seq_values = []
-ir_values = []
-red_values = []
+MAX_SAMPLES = 120 * 200  # Initial buffer: 2 minutes at 200 Hz (doubles if exceeded)
+SAVE_EVERY = 200
+
+# Preallocated sample buffer, one row per sample: seq, IR, Red
+samples = np.empty((MAX_SAMPLES, 3), dtype=np.uint32)
+write_idx = 0
 last_saved = 0
 
-def notification_handler(sender, data):
+def save_samples(end):
+    """Append buffered rows [last_saved, end) to the CSV, writing the header on first save."""
     global last_saved
+    new_file = not os.path.exists(CSV_FILE)
+    with open(CSV_FILE, 'w' if new_file else 'a') as f:
+        np.savetxt(f, samples[last_saved:end], fmt='%d', delimiter=',',
+                   header='seq,IR,Red' if new_file else '', comments='')
+    last_saved = end
+
+def notification_handler(sender, data):
+    global samples, write_idx
     if len(data) != EXPECTED_PACKET_SIZE:
         print(f"[ERROR] Bad packet size: {len(data)}")
         return
 
-    seq = data[0]
-    offset = 1
-    for _ in range(SAMPLES_PER_PACKET):
-        ir = int.from_bytes(data[offset:offset+4], 'big')
-        red = int.from_bytes(data[offset+4:offset+8], 'big')
-        seq_values.append(seq)
-        ir_values.append(ir)
-        red_values.append(red)
-        offset += 8
-
-    current = len(ir_values)
-    if current - last_saved >= 200:
-        df_chunk = pd.DataFrame({
-            'seq': seq_values[last_saved:current],
-            'IR': ir_values[last_saved:current],
-            'Red': red_values[last_saved:current]
-        })
-        mode = 'a' if os.path.exists(CSV_FILE) else 'w'
-        df_chunk.to_csv(CSV_FILE, mode=mode, header=(mode=='w'), index=False)
-        last_saved = current
-        print(f"[CSV] Saved {current} samples")
+    if write_idx + SAMPLES_PER_PACKET > len(samples):
+        samples = np.concatenate((samples, np.empty_like(samples)))
+
+    # Byte 0 is the sequence number, then 16 x (IR, Red) big-endian uint32 pairs
+    block = samples[write_idx:write_idx + SAMPLES_PER_PACKET]
+    block[:, 0] = data[0]
+    block[:, 1:] = np.frombuffer(data, dtype='>u4', count=SAMPLES_PER_PACKET * 2,
+                                 offset=1).reshape(SAMPLES_PER_PACKET, 2)
+    write_idx += SAMPLES_PER_PACKET
+
+    if write_idx - last_saved >= SAVE_EVERY:
+        save_samples(write_idx)
+        print(f"[CSV] Saved {write_idx} samples")
 
 async def start_ble_listener():
-    global last_saved
+    global write_idx, last_saved
 
-    seq_values.clear()
-    ir_values.clear()
-    red_values.clear()
+    write_idx = 0
     last_saved = 0
     if os.path.exists(CSV_FILE):
         os.remove(CSV_FILE)
@@ -101,14 +103,10 @@ async def start_ble_listener():
             await asyncio.sleep(0.5)
 
         # Final save
-        if last_saved < len(ir_values):
-            df_final = pd.DataFrame({
-                'seq': seq_values[last_saved:],
-                'IR': ir_values[last_saved:],
-                'Red': red_values[last_saved:]
-            })
-            df_final.to_csv(CSV_FILE, mode='a', header=not os.path.exists(CSV_FILE), index=False)
-            print(f"[CSV] Final save: {len(df_final)} samples")
+        if last_saved < write_idx:
+            remaining = write_idx - last_saved
+            save_samples(write_idx)
+            print(f"[CSV] Final save: {remaining} samples")
 
     except Exception as e:
         print(f"[ERROR] BLE error: {e}")
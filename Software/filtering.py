@@ -1,11 +1,19 @@
 # filtering.py
 # Modular processor with additional metrics: SDNN, perfusion, respiration
 
+import os
+import json
+import warnings
 import numpy as np
-import matplotlib.pyplot as plt
-from scipy.signal import butter, sosfiltfilt, find_peaks
-from scipy.interpolate import interp1d
-import pandas as pd
+from scipy.signal import butter, sosfiltfilt, sosfilt_zi, find_peaks
+from scipy.interpolate import CubicSpline
+from scipy.fft import rfft, rfftfreq
+from scipy.ndimage import uniform_filter1d
+
+try:
+    from numba import njit, prange
+except ImportError:  # Numba is optional; fall back to plain NumPy
+    njit = None
 
 # ================================================================
 # TUNABLE CONSTANTS
@@ -33,19 +41,349 @@ SPO2_DELAY_SEC = 0.02
 # Set to True when running standalone, False when called from GUI
 PRODUCE_GRAPHS = False
 
+# Filter coefficients depend only on the constants above, so design them once
+# (float32 to match the signal arrays, so sosfiltfilt stays in single precision)
+_BP_SOS = butter(BANDPASS_ORDER, [BANDPASS_LOW, BANDPASS_HIGH], 'band', fs=SAMPLE_RATE, output='sos').astype(np.float32)
+_LP_SOS = butter(4, 0.5, 'low', fs=SAMPLE_RATE, output='sos').astype(np.float32)
+_BP_ZI = sosfilt_zi(_BP_SOS)
+_LP_ZI = sosfilt_zi(_LP_SOS)
+
+# ================================================================
+# BUFFER POOL
+# ================================================================
+# process_ppg_file runs every few seconds on a steadily growing recording, so
+# its large scratch arrays are kept between calls. Capacity is rounded up to a
+# power of two per dimension and callers get a view of the requested shape.
+_buf_cache = {}
+
+def _get_buffer(name, shape, dtype):
+    buf = _buf_cache.get(name)
+    if buf is None or buf.dtype != dtype or any(c < d for c, d in zip(buf.shape, shape)):
+        capacity = tuple(1 << max(int(d) - 1, 0).bit_length() for d in shape)
+        buf = _buf_cache[name] = np.empty(capacity, dtype=dtype)
+    return buf[tuple(slice(0, d) for d in shape)]
+
+def release_buffers():
+    """Drop the pooled scratch arrays, e.g. once a streaming session has ended."""
+    _buf_cache.clear()
+
+# ================================================================
+# HELPERS
+# ================================================================
+def load_ppg_csv(filename):
+    """
+    Read a seq,IR,Red CSV (path or file object) straight into NumPy arrays (no DataFrame).
+    Returns (seq as int64, IR as float32, Red as float32); float32 holds the
+    18-bit ADC readings exactly.
+    """
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", UserWarning)  # header-only file: "input contained no data"
+        rows = np.loadtxt(filename, delimiter=',', skiprows=1, dtype=np.float32, ndmin=2)
+    seq_f, ir_raw, red_raw = rows.reshape(-1, 3).T  # (0, 3) when there are no rows
+    return seq_f.astype(np.int64), ir_raw, red_raw
+
+def read_csv_snapshot(filename):
+    """
+    Read the stream CSV once and cut it at the last newline, in case the writer is mid-append.
+    Returns (raw bytes, number of data rows); load_ppg_csv(io.BytesIO(raw)) parses the snapshot.
+    """
+    with open(filename, 'rb') as f:
+        raw = f.read()
+    raw = raw[:raw.rfind(b"\n") + 1]
+    return raw, max(raw.count(b"\n") - 1, 0)
+
+def publish_metrics(metrics, filename, last_payload=None):
+    """
+    Write metrics as JSON only if they differ from last_payload, swapping the file in
+    atomically so the GUI never reads a half-written JSON. Returns the current payload.
+    """
+    payload = json.dumps(metrics or {})
+    if payload != last_payload:
+        tmp_file = filename + ".tmp"
+        with open(tmp_file, "w") as f:
+            f.write(payload)
+        os.replace(tmp_file, filename)
+    return payload
+
+def moving_average(x, win):
+    """
+    Sliding mean over `win` samples using SciPy's O(N) running-sum filter.
+    Zero padding at the edges matches np.convolve(x, np.ones(win) / win, mode='same').
+    """
+    return uniform_filter1d(x, size=win, mode='constant', cval=0.0)
+
+def central_difference(x):
+    """
+    Same result as np.gradient for a 1-D signal with unit spacing, written
+    straight into one preallocated buffer.
+    """
+    d = np.empty_like(x)
+    np.subtract(x[2:], x[:-2], out=d[1:-1])
+    d[1:-1] *= 0.5
+    d[0] = x[1] - x[0]
+    d[-1] = x[-1] - x[-2]
+    return d
+
+def _pan_tompkins_numpy(x, win):
+    """Derivative, squaring and moving integration as separate NumPy passes."""
+    squared = central_difference(x)
+    np.square(squared, out=squared)
+    return moving_average(squared, win)
+
+if njit is not None:
+    @njit(cache=True, fastmath=True)
+    def _squared_slope(x, i):
+        n = x.size
+        if i == 0:
+            d = x[1] - x[0]
+        elif i == n - 1:
+            d = x[n - 1] - x[n - 2]
+        else:
+            d = 0.5 * (x[i + 1] - x[i - 1])
+        return d * d
+
+    @njit(cache=True, fastmath=True)
+    def _pan_tompkins_jit(x, win):
+        # Single pass: squared central difference fed into a running box sum,
+        # aligned the same way as np.convolve(..., mode='same')
+        n = x.size
+        lead = (win - 1) // 2
+        out = np.empty_like(x)
+        s = 0.0
+        for j in range(n + lead):
+            if j < n:
+                s += _squared_slope(x, j)
+            if j >= win:
+                s -= _squared_slope(x, j - win)
+            if j >= lead:
+                out[j - lead] = s / win
+        return out
+
+def pan_tompkins_envelope(x, win):
+    """
+    Pan-Tompkins envelope of a bandpassed signal: gradient, squared, then a
+    `win`-sample moving average. Uses the Numba kernel when available.
+    """
+    if njit is not None:
+        return _pan_tompkins_jit(np.ascontiguousarray(x), win)
+    return _pan_tompkins_numpy(x, win)
+
+if njit is not None:
+    @njit(cache=True)
+    def _sosfilt_row(sos, zi0, x, y):
+        # Direct-Form II transposed cascade, same recurrence as scipy's _sosfilt
+        n_sec = sos.shape[0]
+        z = np.empty((n_sec, 2))
+        z[:, :] = zi0
+        for i in range(x.size):
+            v = x[i]
+            for s in range(n_sec):
+                out = sos[s, 0] * v + z[s, 0]
+                z[s, 0] = sos[s, 1] * v - sos[s, 4] * out + z[s, 1]
+                z[s, 1] = sos[s, 2] * v - sos[s, 5] * out
+                v = out
+            y[i] = v
+
+    @njit(parallel=True, cache=True)
+    def _sosfiltfilt_jit(sos, zi, x, padlen):
+        n_ch, n = x.shape
+        out = np.empty_like(x)
+        for c in prange(n_ch):
+            # Odd extension at both ends, as sosfiltfilt(padtype='odd')
+            ext = np.empty(n + 2 * padlen)
+            for k in range(padlen):
+                ext[k] = 2 * x[c, 0] - x[c, padlen - k]
+                ext[padlen + n + k] = 2 * x[c, n - 1] - x[c, n - 2 - k]
+            ext[padlen:padlen + n] = x[c]
+            fwd = np.empty_like(ext)
+            _sosfilt_row(sos, zi * ext[0], ext, fwd)
+            rev = fwd[::-1].copy()
+            back = np.empty_like(rev)
+            _sosfilt_row(sos, zi * rev[0], rev, back)
+            for k in range(n):
+                out[c, k] = back[n + padlen - 1 - k]
+        return out
+
+def filtfilt_rows(sos, zi, x):
+    """
+    Zero-phase SOS filter along each row of a 2-D array, equivalent to
+    sosfiltfilt(sos, x, axis=1). With Numba the rows are filtered in parallel.
+    `zi` is sosfilt_zi(sos), precomputed alongside the coefficients.
+    """
+    if njit is None:
+        return sosfiltfilt(sos, x, axis=1)
+    # Default padlen, exactly as scipy derives it
+    ntaps = 2 * len(sos) + 1 - min((sos[:, 2] == 0).sum(), (sos[:, 5] == 0).sum())
+    padlen = 3 * ntaps
+    if x.shape[1] <= padlen:
+        raise ValueError("The length of the input vector x must be greater than "
+                         f"padlen, which is {padlen}.")
+    return _sosfiltfilt_jit(sos, zi, x, padlen)
+
+if njit is not None:
+    @njit(cache=True)
+    def _max_std_jit(x):
+        # Welford's running variance, tracking the max in the same pass
+        mx = x[0]
+        mean = 0.0
+        m2 = 0.0
+        for i in range(x.size):
+            v = x[i]
+            if v > mx:
+                mx = v
+            delta = v - mean
+            mean += delta / (i + 1)
+            m2 += delta * (v - mean)
+        return mx, np.sqrt(m2 / x.size)
+
+if njit is not None:
+    @njit(cache=True)
+    def _detect_peaks_jit(x, min_dist, h_min, prom_min):
+        # Mirrors scipy.signal.find_peaks(height=, distance=, prominence=):
+        # local maxima (plateau midpoints) -> height -> distance -> prominence
+        n = x.size
+        cand = np.empty(n // 2 + 1, np.int64)
+        n_cand = 0
+        i = 1
+        while i < n - 1:
+            if x[i - 1] < x[i]:
+                ahead = i + 1
+                while ahead < n - 1 and x[ahead] == x[i]:
+                    ahead += 1
+                if x[ahead] < x[i]:
+                    mid = (i + ahead - 1) // 2
+                    if x[mid] >= h_min:
+                        cand[n_cand] = mid
+                        n_cand += 1
+                    i = ahead
+            i += 1
+        cand = cand[:n_cand]
+
+        # Refractory distance: tallest peaks win, neighbours closer than min_dist drop out
+        keep = np.ones(n_cand, np.bool_)
+        order = np.argsort(x[cand])
+        for r in range(n_cand - 1, -1, -1):
+            j = order[r]
+            if not keep[j]:
+                continue
+            k = j - 1
+            while k >= 0 and cand[j] - cand[k] < min_dist:
+                keep[k] = False
+                k -= 1
+            k = j + 1
+            while k < n_cand and cand[k] - cand[j] < min_dist:
+                keep[k] = False
+                k += 1
+
+        out = np.empty(n_cand, np.int64)
+        n_out = 0
+        for j in range(n_cand):
+            if not keep[j]:
+                continue
+            p = cand[j]
+            left_min = x[p]
+            k = p
+            while k >= 0 and x[k] <= x[p]:
+                if x[k] < left_min:
+                    left_min = x[k]
+                k -= 1
+            right_min = x[p]
+            k = p
+            while k < n and x[k] <= x[p]:
+                if x[k] < right_min:
+                    right_min = x[k]
+                k += 1
+            if x[p] - max(left_min, right_min) >= prom_min:
+                out[n_out] = p
+                n_out += 1
+        return out[:n_out]
+
+def detect_peaks(x, min_dist, h_min, prom_min):
+    """
+    Indices of peaks at least `h_min` tall, `min_dist` samples apart and with
+    prominence >= `prom_min`. Same selection as scipy's find_peaks, done in a
+    single compiled pass when Numba is available.
+    """
+    if njit is not None:
+        return _detect_peaks_jit(np.ascontiguousarray(x),
+                                 int(min_dist), float(h_min), float(prom_min))
+    peaks, _ = find_peaks(x, distance=min_dist, height=h_min, prominence=prom_min)
+    return peaks
+
+def max_and_std(x):
+    """Maximum and population standard deviation of `x`, in one pass when Numba is available."""
+    if njit is not None:
+        mx, sd = _max_std_jit(np.ascontiguousarray(x))
+        return float(mx), float(sd)
+    return float(x.max()), float(x.std())
+
+if njit is not None:
+    @njit(cache=True)
+    def _ac_dc_stats_jit(sigs, low):
+        n_ch, n = sigs.shape
+        ac_std = np.empty(n_ch)
+        dc_mean = np.empty(n_ch)
+        for c in range(n_ch):
+            # Welford over sig - low, plain running sum over low, one sweep
+            mean = 0.0
+            m2 = 0.0
+            dc_sum = 0.0
+            for i in range(n):
+                v = sigs[c, i] - low[c, i]
+                delta = v - mean
+                mean += delta / (i + 1)
+                m2 += delta * (v - mean)
+                dc_sum += low[c, i]
+            ac_std[c] = np.sqrt(m2 / n)
+            dc_mean[c] = dc_sum / n
+        return ac_std, dc_mean
+
+def ac_dc_stats(sigs, low):
+    """
+    Per-row std of the AC part (sigs - low) and mean of the DC part (low),
+    without materializing sigs - low when Numba is available.
+    """
+    if njit is not None:
+        return _ac_dc_stats_jit(sigs, low)
+    return np.std(sigs - low, axis=1, dtype=np.float64), np.mean(low, axis=1, dtype=np.float64)
+
+def _warm_up_jit():
+    """
+    Compile (or load from cache) every Numba kernel for the dtypes and layouts
+    process_ppg_file passes, so the first real update isn't delayed by JIT.
+    """
+    rows = _get_buffer('warm_up', (2, 2 * SAMPLE_RATE), np.float32)
+    rows[:] = np.sin(np.arange(rows.shape[1], dtype=np.float32) / 10)
+    bp = filtfilt_rows(_BP_SOS, _BP_ZI, rows)
+    ac_dc_stats(rows, filtfilt_rows(_LP_SOS, _LP_ZI, rows))
+    env = pan_tompkins_envelope(bp[0], int(INTEGRATION_WINDOW_SEC * SAMPLE_RATE))
+    env_max, env_std = max_and_std(env)
+    detect_peaks(env, int(MIN_PEAK_DIST_SEC * SAMPLE_RATE), env_max / 2, env_std / 2)
+    _buf_cache.pop('warm_up', None)
+
+if njit is not None:
+    _warm_up_jit()
+
 # ================================================================
 # MAIN PROCESSING FUNCTION
 # ================================================================
-def process_ppg_file(filename: str):
+def process_ppg_file(source):
     """
     Full Pan-Tompkins processing on a PPG CSV file with seq, IR, Red columns.
+    `source` is either the CSV path or an already-parsed (seq, IR, Red) tuple
+    as returned by load_ppg_csv, so callers that have the arrays skip a re-parse.
     Returns dictionary of metrics and (optionally) shows detailed graphs.
     """
+    if PRODUCE_GRAPHS:
+        # Only pay for pyplot (backend probing, font cache) when actually plotting
+        import matplotlib.pyplot as plt
+
     # --- Load data ---
-    df = pd.read_csv(filename)
-    seq = df['seq'].values.astype(int)
-    ir_raw = df['IR'].values.astype(float)
-    red_raw = df['Red'].values.astype(float)
+    if isinstance(source, (str, os.PathLike)):
+        seq, ir_raw, red_raw = load_ppg_csv(source)
+    else:
+        seq, ir_raw, red_raw = (np.asarray(a) for a in source)
+        seq = seq.astype(np.int64, copy=False)
 
     # --- Gap reconstruction using sequence number ---
     max_seq = seq.max()
@@ -55,31 +393,38 @@ def process_ppg_file(filename: str):
     print(f"Max seq: {max_seq} → {true_total_packets} packets attempted")
     print(f"True timeline: {total_samples} samples = {total_samples / SAMPLE_RATE:.1f} seconds")
 
-    ir_full = np.full(total_samples, np.nan)
-    red_full = np.full(total_samples, np.nan)
+    # Native ADC integers (IR, Red columns) plus an explicit mask of received slots
+    raw_full = _get_buffer('raw_full', (total_samples, 2), np.int32)
+    valid = _get_buffer('valid', (total_samples,), np.bool_)
+    raw_full.fill(0)
+    valid.fill(False)
 
-    for i in range(len(df)):
-        s = seq[i]
-        sample_in_packet = i % BATCH_SIZE
-        idx = s * BATCH_SIZE + sample_in_packet
-        if idx < total_samples:
-            ir_full[idx] = ir_raw[i]
-            red_full[idx] = red_raw[i]
+    # Scatter every sample into its slot on the true timeline in one pass
+    sample_in_packet = np.arange(len(seq), dtype=np.int64) % BATCH_SIZE
+    idx = seq.astype(np.int64) * BATCH_SIZE + sample_in_packet
+    in_range = idx < total_samples
+    raw_full[idx[in_range], 0] = ir_raw[in_range]
+    raw_full[idx[in_range], 1] = red_raw[in_range]
+    valid[idx[in_range]] = True
 
     t_full = np.arange(total_samples) / SAMPLE_RATE
 
-    # Interpolate missing packets
-    valid = ~np.isnan(ir_full)
-    interp_ir = interp1d(np.arange(total_samples)[valid], ir_full[valid],
-                         kind='cubic', bounds_error=False, fill_value='extrapolate')
-    ir_fixed = interp_ir(np.arange(total_samples))
-
-    interp_red = interp1d(np.arange(total_samples)[valid], red_full[valid],
-                          kind='cubic', bounds_error=False, fill_value='extrapolate')
-    red_fixed = interp_red(np.arange(total_samples))
+    # Interpolate missing packets (one spline fit shared by IR and Red),
+    # evaluated only at the slots that never arrived
+    valid_idx = np.flatnonzero(valid)
+    missing_idx = np.flatnonzero(~valid)
+    # Everything signal-sized from here on is float32: half the memory traffic
+    # and twice the SIMD lanes; RR/HRV metrics below stay float64
+    fixed = _get_buffer('fixed', (total_samples, 2), np.float32)
+    np.copyto(fixed, raw_full)
+    if missing_idx.size:
+        spline = CubicSpline(valid_idx, fixed[valid_idx])
+        fixed[missing_idx] = spline(missing_idx)
+    ir_fixed, red_fixed = fixed[:, 0], fixed[:, 1]
 
     if PRODUCE_GRAPHS:
         plt.figure(figsize=(15, 5))
+        ir_full = np.where(valid, raw_full[:, 0], np.nan)
         plt.plot(t_full, ir_full, label='Raw IR (with gaps)', alpha=0.7, color='lightgray')
         plt.plot(t_full, ir_fixed, label='Interpolated IR (full timeline)', linewidth=1.5, color='blue')
         plt.title('1. Raw Data + Gap-Filled Interpolation')
@@ -111,7 +456,13 @@ def process_ppg_file(filename: str):
         plt.show()
 
     # --- AC component (zero-mean) ---
-    ir_ac = ir_trim - np.mean(ir_trim)
+    # IR and Red share one (2, N) buffer; the DC levels are broadcast off in place
+    ac_stack = _get_buffer('ac_stack', (2, len(ir_trim)), np.float32)
+    ac_stack[0] = ir_trim
+    ac_stack[1] = red_trim
+    dc_trim = ac_stack.mean(axis=1)
+    ac_stack -= dc_trim[:, None]
+    ir_ac = ac_stack[0]
 
     if PRODUCE_GRAPHS:
         plt.figure(figsize=(15, 5))
@@ -124,12 +475,8 @@ def process_ppg_file(filename: str):
         plt.tight_layout()
         plt.show()
 
-    # --- Bandpass filter ---
-    def bandpass_filter(sig):
-        sos = butter(BANDPASS_ORDER, [BANDPASS_LOW, BANDPASS_HIGH], 'band', fs=SAMPLE_RATE, output='sos')
-        return sosfiltfilt(sos, sig)
-
-    ir_bp = bandpass_filter(ir_ac)
+    # --- Bandpass filter (IR and Red filtered together, one row each) ---
+    ir_bp, red_bp = filtfilt_rows(_BP_SOS, _BP_ZI, ac_stack)
 
     if PRODUCE_GRAPHS:
         plt.figure(figsize=(15, 5))
@@ -142,10 +489,15 @@ def process_ppg_file(filename: str):
         plt.tight_layout()
         plt.show()
 
-    # --- Derivative (gradient) ---
-    deriv = np.gradient(ir_bp)
+    # --- Derivative -> squared -> moving integration (fused) ---
+    win = int(INTEGRATION_WINDOW_SEC * SAMPLE_RATE)
+    integrated = pan_tompkins_envelope(ir_bp, win)
 
     if PRODUCE_GRAPHS:
+        # Intermediate stages are only materialized for plotting
+        deriv = central_difference(ir_bp)
+        squared = deriv ** 2
+
         plt.figure(figsize=(15, 5))
         plt.plot(t_trim, deriv, color='orange', linewidth=1.2)
         plt.title('5. Derivative (emphasizes slopes)')
@@ -156,10 +508,6 @@ def process_ppg_file(filename: str):
         plt.tight_layout()
         plt.show()
 
-    # --- Squared ---
-    squared = deriv ** 2
-
-    if PRODUCE_GRAPHS:
         plt.figure(figsize=(15, 5))
         plt.plot(t_trim, squared, color='red', linewidth=1.2)
         plt.title('6. Squared (non-linear amplification)')
@@ -169,12 +517,6 @@ def process_ppg_file(filename: str):
         plt.tight_layout()
         plt.show()
 
-    # --- Moving integration ---
-    win = int(INTEGRATION_WINDOW_SEC * SAMPLE_RATE)
-    kernel = np.ones(win) / win
-    integrated = np.convolve(squared, kernel, mode='same')
-
-    if PRODUCE_GRAPHS:
         plt.figure(figsize=(15, 5))
         plt.plot(t_trim, integrated, color='darkblue', linewidth=1.5)
         plt.title('7. Moving Window Integration (one bump per beat)')
@@ -186,10 +528,10 @@ def process_ppg_file(filename: str):
 
     # --- Peak detection ---
     min_dist = int(MIN_PEAK_DIST_SEC * SAMPLE_RATE)
-    peaks, _ = find_peaks(integrated,
-                          distance=min_dist,
-                          height=PEAK_HEIGHT_FACTOR * integrated.max(),
-                          prominence=PEAK_PROMINENCE_FACTOR * integrated.std())
+    env_max, env_std = max_and_std(integrated)
+    peaks = detect_peaks(integrated, min_dist,
+                         PEAK_HEIGHT_FACTOR * env_max,
+                         PEAK_PROMINENCE_FACTOR * env_std)
 
     if PRODUCE_GRAPHS:
         plt.figure(figsize=(15, 5))
@@ -207,7 +549,8 @@ def process_ppg_file(filename: str):
     if len(peaks) > 1:
         rr_ms = np.diff(peaks) / SAMPLE_RATE * 1000
         median_rr = np.median(rr_ms)
-        valid = (rr_ms > RR_LOWER_FACTOR * median_rr) & (rr_ms < RR_UPPER_FACTOR * median_rr)
+        rr_lo, rr_hi = RR_LOWER_FACTOR * median_rr, RR_UPPER_FACTOR * median_rr
+        valid = (rr_ms > rr_lo) & (rr_ms < rr_hi)
         rr_clean = rr_ms[valid]
 
         if len(rr_clean) > 0:
@@ -216,11 +559,11 @@ def process_ppg_file(filename: str):
             mean_hr = np.mean(hr_bpm)
             rmssd = np.sqrt(np.mean(np.diff(rr_clean)**2))
             sdnn = np.std(rr_clean)  # Additional HRV metric
-            perfusion_x10 = int((np.std(ir_bp) / np.mean(ir_trim)) * 1000)
+            perfusion_x10 = int((np.std(ir_bp, dtype=np.float64) / dc_trim[0]) * 1000)
 
             # Respiration rate estimate (FFT on low-freq PPG)
-            fft = np.fft.rfft(ir_bp)
-            freq = np.fft.rfftfreq(len(ir_bp), 1/SAMPLE_RATE)
+            fft = rfft(ir_bp, workers=-1)
+            freq = rfftfreq(len(ir_bp), 1/SAMPLE_RATE)
             low_freq_mask = (freq > 0.1) & (freq < 0.5)
             resp_freq = freq[low_freq_mask][np.argmax(np.abs(fft[low_freq_mask]))]
             respiration = resp_freq * 60  # breaths/min
@@ -246,21 +589,22 @@ def process_ppg_file(filename: str):
         print("No peaks detected")
 
     # --- SpO2 estimate ---
-    red_bp = bandpass_filter(red_trim - np.mean(red_trim))
+    # Red delayed by `delay` samples (edge-padded), written directly into the
+    # (2, N) buffer the AC/DC low-pass consumes alongside IR
     delay = int(SPO2_DELAY_SEC * SAMPLE_RATE)
-    red_shifted = np.roll(red_bp, delay)
-    red_shifted[:delay] = red_shifted[delay]
+    n = len(red_bp)
+    spo2_stack = _get_buffer('spo2_stack', (2, n), ir_bp.dtype)
+    spo2_stack[0] = ir_bp
+    red_shifted = spo2_stack[1]
+    red_shifted[delay:] = red_bp[:n - delay]
+    red_shifted[:delay] = red_bp[0]
 
-    def ac_dc(sig):
-        sos = butter(4, 0.5, 'low', fs=SAMPLE_RATE, output='sos')
-        low = sosfiltfilt(sos, sig)
-        ac = sig - low
-        return np.std(ac), np.mean(low)
+    def ac_dc(sigs):
+        return ac_dc_stats(sigs, filtfilt_rows(_LP_SOS, _LP_ZI, sigs))
 
-    ac_ir, dc_ir = ac_dc(ir_bp)
-    ac_red, dc_red = ac_dc(red_shifted)
+    (ac_ir, ac_red), (dc_ir, dc_red) = ac_dc(spo2_stack)
     R = (ac_red / dc_red) / (ac_ir / dc_ir + 1e-8)
-    spo2 = np.clip(110 - 25 * R, 85, 100)
+    spo2 = float(np.clip(110 - 25 * R, 85, 100))
     print(f"Estimated SpO2: {spo2:.1f}%")
 
     return {
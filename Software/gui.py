@@ -6,8 +6,28 @@ import streamlit as st
 import json
 import time
 import os
+import math
+from dataclasses import dataclass, fields
 import numpy as np
-import matplotlib.pyplot as plt
+
+@dataclass
+class Metrics:
+    """Metrics as shown on screen; anything missing or non-numeric is NaN."""
+    mean_hr: float = math.nan
+    spo2: float = math.nan
+    rmssd: float = math.nan
+    sdnn: float = math.nan
+    perfusion_index_x10: float = math.nan
+    respiration_rate: float = math.nan
+
+    @classmethod
+    def from_dict(cls, d):
+        # Validate once when the JSON is loaded instead of on every redraw
+        return cls(**{f.name: float(v) if isinstance(v := d.get(f.name), (int, float)) else math.nan
+                      for f in fields(cls)})
+
+def fmt(value, spec, missing="—"):
+    return spec.format(value) if math.isfinite(value) else missing
 
 st.set_page_config(layout="wide")
 st.title("BioWatch PPG Health Monitor")
@@ -17,6 +37,9 @@ if 'test_running' not in st.session_state:
     st.session_state.test_running = False
 if 'metrics_history' not in st.session_state:
     st.session_state.metrics_history = []
+if 'latest_metrics' not in st.session_state:
+    st.session_state.latest_metrics = Metrics()
+    st.session_state.metrics_mtime = None
 
 # BLE connection status
 ble_connected = os.path.exists("ble_connected.txt")
@@ -45,6 +68,7 @@ if not st.session_state.test_running:
             st.session_state.test_running = True
             st.session_state.start_time = time.time()
             st.session_state.metrics_history = []
+            st.session_state.latest_metrics = Metrics()  # Don't show the previous test's file
             open("start.txt", "w").close()
             st.success("Test started – streaming from sensor")
             st.rerun()
@@ -70,31 +94,32 @@ if st.session_state.test_running:
             st.session_state.test_running = False
             st.success("Test stopped manually")
 
-        # Load metrics
+        # Load metrics only when the processing thread has written a new file;
+        # otherwise redraw from the copy kept in session state
         try:
-            with open("latest_metrics.json", "r") as f:
-                metrics = json.load(f)
-            st.session_state.metrics_history.append(metrics)
-        except:
-            metrics = {}
+            metrics_mtime = os.stat("latest_metrics.json").st_mtime_ns
+        except OSError:
+            metrics_mtime = None
+        if metrics_mtime is not None and metrics_mtime != st.session_state.metrics_mtime:
+            try:
+                with open("latest_metrics.json", "r") as f:
+                    st.session_state.latest_metrics = Metrics.from_dict(json.load(f))
+                st.session_state.metrics_history.append(st.session_state.latest_metrics)
+                st.session_state.metrics_mtime = metrics_mtime
+            except:
+                pass
+        metrics = st.session_state.latest_metrics
 
         # Display all metrics (same as your full version)
         col1, col2, col3, col4 = st.columns(4)
-
-        hr = metrics.get('mean_hr')
-        col1.metric("Heart Rate", f"{hr:.1f} bpm" if isinstance(hr, (int, float)) and hr is not None else "— bpm")
-
-        spo2 = metrics.get('spo2')
-        col2.metric("SpO₂", f"{spo2:.1f}%" if isinstance(spo2, (int, float)) and spo2 is not None else "—%")
-
-        rmssd = metrics.get('rmssd')
-        col3.metric("RMSSD (HRV)", f"{rmssd:.1f} ms" if isinstance(rmssd, (int, float)) and rmssd is not None else "— ms")
-
-        sdnn = metrics.get('sdnn')
-        col4.metric("SDNN (HRV)", f"{sdnn:.1f} ms" if isinstance(sdnn, (int, float)) and sdnn is not None else "— ms")
+        col1.metric("Heart Rate", fmt(metrics.mean_hr, "{:.1f} bpm", "— bpm"))
+        col2.metric("SpO₂", fmt(metrics.spo2, "{:.1f}%", "—%"))
+        col3.metric("RMSSD (HRV)", fmt(metrics.rmssd, "{:.1f} ms", "— ms"))
+        col4.metric("SDNN (HRV)", fmt(metrics.sdnn, "{:.1f} ms", "— ms"))
 
         # Stress Level
-        if isinstance(rmssd, (int, float)) and rmssd is not None:
+        rmssd = metrics.rmssd
+        if math.isfinite(rmssd):
             if rmssd > 50:
                 stress_level = "Low"
             elif rmssd > 30:
@@ -106,13 +131,10 @@ if st.session_state.test_running:
         st.metric("Stress Level", stress_level)
 
         # Perfusion Index
-        perfusion_raw = metrics.get('perfusion_index_x10')
-        perfusion = perfusion_raw / 10 if isinstance(perfusion_raw, (int, float)) else None
-        st.metric("Perfusion Index", f"{perfusion:.2f}" if perfusion is not None else "—")
+        st.metric("Perfusion Index", fmt(metrics.perfusion_index_x10 / 10, "{:.2f}"))
 
         # Respiration Rate
-        resp = metrics.get('respiration_rate')
-        st.metric("Respiration Rate", f"{resp:.1f} br/min" if isinstance(resp, (int, float)) and resp is not None else "—")
+        st.metric("Respiration Rate", fmt(metrics.respiration_rate, "{:.1f} br/min"))
 
     time.sleep(1)
     st.rerun()
@@ -123,20 +145,14 @@ if not st.session_state.test_running and st.session_state.metrics_history:
     final = st.session_state.metrics_history[-1]
 
     col1, col2, col3, col4 = st.columns(4)
-    hr = final.get('mean_hr')
-    col1.metric("Average HR", f"{hr:.1f} bpm" if isinstance(hr, (int, float)) else "— bpm")
-
-    spo2 = final.get('spo2')
-    col2.metric("SpO₂", f"{spo2:.1f}%" if isinstance(spo2, (int, float)) else "—%")
-
-    rmssd = final.get('rmssd')
-    col3.metric("RMSSD", f"{rmssd:.1f} ms" if isinstance(rmssd, (int, float)) else "— ms")
-
-    sdnn = final.get('sdnn')
-    col4.metric("SDNN", f"{sdnn:.1f} ms" if isinstance(sdnn, (int, float)) else "— ms")
+    col1.metric("Average HR", fmt(final.mean_hr, "{:.1f} bpm", "— bpm"))
+    col2.metric("SpO₂", fmt(final.spo2, "{:.1f}%", "—%"))
+    col3.metric("RMSSD", fmt(final.rmssd, "{:.1f} ms", "— ms"))
+    col4.metric("SDNN", fmt(final.sdnn, "{:.1f} ms", "— ms"))
 
     # VO2 Max Estimate
-    if isinstance(hr, (int, float)) and hr > 0:
+    hr = final.mean_hr
+    if math.isfinite(hr) and hr > 0:
         factor = 15.3 if sex == "Male" else 14.7
         vo2_max = factor * (220 - age) / hr
         st.metric("Estimated VO2 Max", f"{vo2_max:.1f} mL/kg/min")
@@ -144,9 +160,12 @@ if not st.session_state.test_running and st.session_state.metrics_history:
         st.metric("Estimated VO2 Max", "— (no HR)")
 
     # HR Trend Graph
-    hr_list = [m['mean_hr'] for m in st.session_state.metrics_history if isinstance(m.get('mean_hr'), (int, float))]
+    hr_list = [m.mean_hr for m in st.session_state.metrics_history if math.isfinite(m.mean_hr)]
     if hr_list:
-        fig, ax = plt.subplots(figsize=(12, 5))
+        # Figure directly (no pyplot) avoids global backend state inside Streamlit
+        from matplotlib.figure import Figure
+        fig = Figure(figsize=(12, 5))
+        ax = fig.subplots()
         ax.plot(hr_list, color='green', linewidth=2.5, marker='o')
         ax.set_title("Heart Rate Trend During Test")
         ax.set_xlabel("Update (~every 5s)")
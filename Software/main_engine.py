@@ -6,28 +6,69 @@ import threading
 import subprocess
 import time
 import os
-import pandas as pd
+import io
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 
 from ble_connection import start_ble_listener_thread
-from filtering import process_ppg_file
+from filtering import load_ppg_csv, process_ppg_file, publish_metrics, read_csv_snapshot, release_buffers
 
 CSV_FILE = "latest_ppg_data.csv"
 METRICS_FILE = "latest_metrics.json"
 MIN_SAMPLES_FOR_PROCESS = 1000  # ~5s at 200 Hz
+IDLE_POLLS_BEFORE_RELEASE = 6  # ~30s without new rows ends the session
+
+def process_csv_bytes(raw):
+    """Parse and process one snapshot of the stream CSV (runs in the worker process)."""
+    return process_ppg_file(load_ppg_csv(io.BytesIO(raw)))
+
+def start_worker_pool():
+    """
+    Single worker process for the filters, so they never hold this process's GIL while the
+    BLE notification handler needs it. Spawned rather than forked: we are called from a
+    non-main thread after Numba's parallel warm-up and the BLE thread have started.
+    """
+    return ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn"))
 
 def processing_thread():
-    while True:
-        try:
-            if os.path.exists(CSV_FILE):
-                df = pd.read_csv(CSV_FILE)
-                if len(df) >= MIN_SAMPLES_FOR_PROCESS:
-                    metrics = process_ppg_file(CSV_FILE)
-                    with open(METRICS_FILE, "w") as f:
-                        import json
-                        json.dump(metrics or {}, f)
-        except Exception as e:
-            print(f"Processing error: {e}")
-        time.sleep(5)
+    pool = start_worker_pool()
+    try:
+        last_key = None
+        last_payload = None
+        idle_polls = 0
+        while True:
+            try:
+                # Nothing new since the last poll (e.g. streaming paused/stopped): skip
+                st = os.stat(CSV_FILE) if os.path.exists(CSV_FILE) else None
+                key = (st.st_mtime_ns, st.st_size) if st else None
+                if key != last_key:
+                    last_key = key
+                    idle_polls = 0
+                    if key is not None:
+                        # One read per poll; the row check and the parse both use these bytes
+                        raw, n_rows = read_csv_snapshot(CSV_FILE)
+                        if n_rows >= MIN_SAMPLES_FOR_PROCESS:
+                            metrics = pool.submit(process_csv_bytes, raw).result()
+                            last_payload = publish_metrics(metrics, METRICS_FILE, last_payload)
+                else:
+                    idle_polls += 1
+                    if idle_polls == IDLE_POLLS_BEFORE_RELEASE:
+                        # The CSV stays on disk after a session, so "no new rows for a while"
+                        # is the end-of-session signal: free the worker's pooled arrays
+                        pool.submit(release_buffers)
+            except BrokenProcessPool:
+                # Worker died (e.g. crash in a JIT kernel or OOM): start a fresh one and
+                # retry the current snapshot on the next poll
+                print("Processing worker died, restarting it")
+                pool.shutdown(wait=False)
+                pool = start_worker_pool()
+                last_key = None
+            except Exception as e:
+                print(f"Processing error: {e}")
+            time.sleep(5)
+    finally:
+        pool.shutdown(wait=False)
 
 if __name__ == "__main__":
     # Force correct working directory so all files (CSV, flags) are in the same folder
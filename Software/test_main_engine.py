@@ -5,25 +5,38 @@ import threading
 import subprocess
 import time
 import os
-import json
-from filtering import process_ppg_file
-import pandas as pd
+import io
+from filtering import load_ppg_csv, process_ppg_file, publish_metrics, read_csv_snapshot, release_buffers
 
 CSV_FILE = "latest_ppg_data.csv"
 METRICS_FILE = "latest_metrics.json"
 MIN_SAMPLES = 1000
+IDLE_POLLS_BEFORE_RELEASE = 6  # ~30s without new rows ends the session
 
 def processing_thread():
+    last_key = None
+    last_payload = None
+    idle_polls = 0
     while True:
-        if os.path.exists(CSV_FILE):
-            try:
-                df = pd.read_csv(CSV_FILE)
-                if len(df) >= MIN_SAMPLES:
-                    metrics = process_ppg_file(CSV_FILE)
-                    with open(METRICS_FILE, "w") as f:
-                        json.dump(metrics or {}, f)
-            except Exception as e:
-                print(f"Processing error: {e}")
+        try:
+            # Skip the poll entirely if the CSV hasn't changed since last time
+            st = os.stat(CSV_FILE) if os.path.exists(CSV_FILE) else None
+            key = (st.st_mtime_ns, st.st_size) if st else None
+            if key != last_key:
+                last_key = key
+                idle_polls = 0
+                if key is not None:
+                    # Same snapshot as main_engine: one read, cut at the last complete row
+                    raw, n_rows = read_csv_snapshot(CSV_FILE)
+                    if n_rows >= MIN_SAMPLES:
+                        metrics = process_ppg_file(load_ppg_csv(io.BytesIO(raw)))
+                        last_payload = publish_metrics(metrics, METRICS_FILE, last_payload)
+            else:
+                idle_polls += 1
+                if idle_polls == IDLE_POLLS_BEFORE_RELEASE:
+                    release_buffers()  # Stream has stopped: free the pooled arrays
+        except Exception as e:
+            print(f"Processing error: {e}")
         time.sleep(5)
 
 if __name__ == "__main__":
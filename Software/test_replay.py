@@ -4,7 +4,7 @@
 
 import asyncio
 import os
-import pandas as pd
+import numpy as np
 import time
 
 CSV_FILE = "test_data.csv"
@@ -18,8 +18,8 @@ async def replay_csv(csv_path="test_data.csv"):
     open(CONNECTED_FLAG, "w").close()
 
     print(f"[REPLAY] Loading {csv_path}...")
-    df = pd.read_csv(csv_path)
-    total_samples = len(df)
+    data = np.loadtxt(csv_path, delimiter=',', skiprows=1, dtype=np.int64, ndmin=2)
+    total_samples = len(data)
     print(f"[REPLAY] Loaded {total_samples} samples ({total_samples/SAMPLE_RATE:.1f}s)")
 
     print("[REPLAY] Waiting for start.txt...")
@@ -31,28 +31,31 @@ async def replay_csv(csv_path="test_data.csv"):
     start_time = time.time()
     saved = 0
 
-    for i in range(0, total_samples, CHUNK_SIZE):
-        if os.path.exists(STOP_FLAG):
-            elapsed = time.time() - start_time
-            if elapsed >= 30:  # Respect minimum duration like real system
-                os.remove(STOP_FLAG)
-                print(f"[REPLAY] Stopped at {elapsed:.1f}s")
-                break
-            else:
-                os.remove(STOP_FLAG)
-        chunk = df.iloc[i:i + CHUNK_SIZE]
-        mode = 'a' if saved > 0 else 'w'
-        chunk.to_csv(CSV_FILE, mode=mode, header=(mode == 'w'), index=False)
-        saved += len(chunk)
-        print(f"[REPLAY] Streamed {saved}/{total_samples} samples")
-
-        # Simulate real-time playback
-        await asyncio.sleep(CHUNK_SIZE / SAMPLE_RATE)
-
-    if saved < total_samples:
-        final_chunk = df.iloc[saved:]
-        final_chunk.to_csv(CSV_FILE, mode='a', header=False, index=False)
-        print(f"[REPLAY] Final chunk: {len(final_chunk)} samples")
+    # Keep one handle open for the whole replay instead of reopening per chunk
+    with open(CSV_FILE, 'w') as out:
+        out.write('seq,IR,Red\n')
+        for i in range(0, total_samples, CHUNK_SIZE):
+            if os.path.exists(STOP_FLAG):
+                elapsed = time.time() - start_time
+                if elapsed >= 30:  # Respect minimum duration like real system
+                    os.remove(STOP_FLAG)
+                    print(f"[REPLAY] Stopped at {elapsed:.1f}s")
+                    break
+                else:
+                    os.remove(STOP_FLAG)
+            chunk = data[i:i + CHUNK_SIZE]
+            np.savetxt(out, chunk, fmt='%d', delimiter=',')
+            out.flush()
+            saved += len(chunk)
+            print(f"[REPLAY] Streamed {saved}/{total_samples} samples")
+
+            # Simulate real-time playback
+            await asyncio.sleep(CHUNK_SIZE / SAMPLE_RATE)
+
+        if saved < total_samples:
+            final_chunk = data[saved:]
+            np.savetxt(out, final_chunk, fmt='%d', delimiter=',')
+            print(f"[REPLAY] Final chunk: {len(final_chunk)} samples")
 
     if os.path.exists(CONNECTED_FLAG):
         os.remove(CONNECTED_FLAG)